@@ -0,0 +1,83 @@
+import gevent.monkey
+gevent.monkey.patch_all()
+import argparse
+import datetime as dt
+import gzip
+import json
+import os
+import sys
+import warnings
+from sqlalchemy import delete, select
+from app import app, db, hora_ensenada, ChatLog, AnalisisInteraccion, ChatLogArchive, AnalisisInteraccionArchive
+warnings.simplefilter("ignore")
+
+# ------------------------------------------------------------------------------------
+# Chat Archival (hot / cold tiers)
+# ------------------------------------------------------------------------------------
+# Moves railway_chat_log rows older than the horizon (and their analyses) into the
+# *_archive tables, in small id-ordered batches so each transaction stays short and
+# the hot table keeps only recent activity. Teacher views read both tiers through
+# chat_tiers()/analysis_tiers() in app.py. Optionally every moved row is also appended
+# to monthly NDJSON.gz files for off-database cold storage.
+#
+# Usage: python archive.py [--days 180] [--batch 2000] [--export DIR] [--dry-run]
+
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "2000"))
+
+def _export_rows(export_dir, prefix, rows):
+    """Appends rows to <prefix>-YYYY-MM.ndjson.gz (gzip members concatenate, so appending is safe)."""
+    by_month = {}
+    for row in rows:
+        month = row["created_at"].strftime("%Y-%m") if row["created_at"] else "sin-fecha"
+        by_month.setdefault(month, []).append(row)
+    for month, items in by_month.items():
+        path = os.path.join(export_dir, f"{prefix}-{month}.ndjson.gz")
+        with gzip.open(path, "at", encoding="utf-8") as fh:
+            for row in items:
+                fh.write(json.dumps(row, default=lambda v: v.isoformat() if isinstance(v, dt.datetime) else str(v), ensure_ascii=False) + "\n")
+
+def _move(conn, hot, cold, where, export_dir=None, prefix=None):
+    columns = [c.name for c in cold.__table__.columns]
+    if export_dir:
+        rows = conn.execute(select(*[hot.__table__.c[c] for c in columns]).where(where)).mappings().all()
+        _export_rows(export_dir, prefix, [dict(r) for r in rows])
+    conn.execute(cold.__table__.insert().from_select(columns, select(*[hot.__table__.c[c] for c in columns]).where(where)))
+    return conn.execute(delete(hot.__table__).where(where)).rowcount
+
+def archive_old_chats(days=ARCHIVE_HORIZON_DAYS, batch_size=ARCHIVE_BATCH_SIZE, export_dir=None, dry_run=False):
+    cutoff = hora_ensenada() - dt.timedelta(days=days)
+    print(f"🗄️ Archivando chats anteriores a {cutoff.isoformat()} (lotes de {batch_size})")
+    if export_dir:
+        os.makedirs(export_dir, exist_ok=True)
+    if dry_run:
+        pending = db.session.query(ChatLog.id).filter(ChatLog.created_at < cutoff).count()
+        print(f"   {pending} mensajes serían archivados")
+        return {"chats": 0, "analisis": 0}
+
+    moved = {"chats": 0, "analisis": 0}
+    while True:
+        with db.engine.begin() as conn:
+            ids = conn.execute(
+                select(ChatLog.id).where(ChatLog.created_at < cutoff).order_by(ChatLog.id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            # Primero los análisis que apuntan a estos mensajes (FK chat_id), aunque sean más recientes
+            moved["analisis"] += _move(conn, AnalisisInteraccion, AnalisisInteraccionArchive,
+                                       AnalisisInteraccion.chat_id.in_(ids), export_dir, "analisis_interaccion")
+            moved["chats"] += _move(conn, ChatLog, ChatLogArchive, ChatLog.id.in_(ids), export_dir, "chat_log")
+        print(f"   ... {moved['chats']} mensajes / {moved['analisis']} análisis movidos")
+    print(f"✅ Archivado terminado: {moved['chats']} mensajes, {moved['analisis']} análisis")
+    return moved
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old chat log rows to the archive tier.")
+    parser.add_argument("--days", type=int, default=ARCHIVE_HORIZON_DAYS, help="keep this many days in the hot table")
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--export", metavar="DIR", help="also append moved rows to monthly NDJSON.gz files in DIR")
+    parser.add_argument("--dry-run", action="store_true", help="only count rows older than the horizon")
+    args = parser.parse_args()
+    with app.app_context():
+        archive_old_chats(args.days, args.batch, args.export, args.dry_run)
+    sys.exit(0)
@@ -0,0 +1,80 @@
+import os, sys, json, time, random, tempfile
+import datetime as dt
+
+# Synthetic benchmark for the teacher-side read path (get_teacher_filtered_responses + JSON encoding).
+# Usage: python bench_teacher_endpoints.py [rows]   (uses a throwaway SQLite DB, never DATABASE_URL)
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+
+from app import app, db, get_teacher_filtered_responses, Usuario, RespuestaUsuario, Profesor, ListaClase, ListaEjercicios
+
+STUDENTS = 200
+PRACTICES = [f"Practica-{i}.json" for i in range(5)]
+STATUSES = ["pending", "approved", "edited"]
+
+def seed():
+    db.create_all()
+    prof = Profesor(email="bench@uabc.edu.mx", password_hash="x", nombre="Bench")
+    db.session.add(prof)
+    db.session.flush()
+    emails = [f"alumno{i}@uabc.edu.mx" for i in range(STUDENTS)]
+    db.session.execute(Usuario.__table__.insert(), [{"correo_identificacion": e, "password_hash": "x", "nombre": e.split("@")[0]} for e in emails])
+    db.session.execute(ListaClase.__table__.insert(), [{"profesor_id": prof.id, "student_email": e} for e in emails])
+    db.session.execute(ListaEjercicios.__table__.insert(), [{"profesor_id": prof.id, "exercise_filename": p, "is_active": True} for p in PRACTICES])
+    base = dt.datetime(2025, 1, 1)
+    rnd = random.Random(7)
+    batch = []
+    for i in range(ROWS):
+        batch.append({
+            "correo_identificacion": emails[i % STUDENTS], "practice_name": PRACTICES[i % len(PRACTICES)],
+            "problema_id": i % 10, "respuesta": "x" * rnd.randint(50, 400), "created_at": base + dt.timedelta(seconds=i),
+            "llm_score": float(rnd.randint(0, 10)), "llm_comment": "Comentario de prueba", "status": STATUSES[i % 3],
+        })
+        if len(batch) == 5000:
+            db.session.execute(RespuestaUsuario.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(RespuestaUsuario.__table__.insert(), batch)
+    db.session.commit()
+    return prof.id
+
+def orm_baseline(prof_id, status_filter):
+    # The pre-optimization path: hydrate full ORM objects, build dicts, stdlib json
+    my_students = [s.student_email for s in ListaClase.query.filter_by(profesor_id=prof_id).all()]
+    my_exercises = [e.exercise_filename for e in ListaEjercicios.query.filter_by(profesor_id=prof_id).all()]
+    results = db.session.query(RespuestaUsuario, Usuario.nombre).outerjoin(
+        Usuario, RespuestaUsuario.correo_identificacion == Usuario.correo_identificacion
+    ).filter(
+        RespuestaUsuario.correo_identificacion.in_(my_students),
+        RespuestaUsuario.practice_name.in_(my_exercises),
+        RespuestaUsuario.status.in_(status_filter),
+    ).order_by(RespuestaUsuario.created_at.desc()).all()
+    data = [{
+        "id": r.id, "nombre": nombre or "Estudiante", "correo": r.correo_identificacion, "practica": r.practice_name,
+        "problema_id": r.problema_id, "respuesta": r.respuesta, "llm_score": r.llm_score, "llm_comment": r.llm_comment,
+        "teacher_score": r.teacher_score, "teacher_comment": r.teacher_comment, "status": r.status,
+        "fecha": r.created_at.isoformat() if r.created_at else "",
+    } for r, nombre in results]
+    return data, json.dumps(data, sort_keys=True, separators=(",", ":"))
+
+def projected(prof_id, status_filter):
+    data = get_teacher_filtered_responses(prof_id, status_filter)
+    return data, app.json.dumps(data)
+
+def measure(label, fn, prof_id):
+    status_filter = ["approved", "edited", "pending"]
+    db.session.expunge_all()
+    start = time.perf_counter()
+    data, body = fn(prof_id, status_filter)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {len(data):>8} filas  {elapsed:7.3f}s  {len(data) / elapsed:>10,.0f} filas/s  {len(body) / 1e6:6.1f} MB")
+
+if __name__ == "__main__":
+    with app.app_context():
+        print(f"Sembrando {ROWS:,} respuestas en {DB_FILE} ...")
+        prof_id = seed()
+        measure("antes (ORM + json)", orm_baseline, prof_id)
+        measure("después (tuplas + orjson)", projected, prof_id)
+    os.remove(DB_FILE)
@@ -0,0 +1,42 @@
+import os, sys, gzip, tempfile
+import datetime as dt
+
+# Runs every run_cpu() call site through CPU_POOL_KIND=process and compares with the inline result.
+# A callable that can't be pickled (bound methods, lambdas, closures) fails here instead of in production.
+# Usage: python check_cpu_pool.py   (uses a throwaway SQLite DB, never DATABASE_URL; exit code 1 on failure)
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "check.db")
+os.environ["CPU_POOL_KIND"] = "process"
+os.environ["CPU_POOL_WORKERS"] = "2"
+
+def cases():
+    from werkzeug.security import generate_password_hash, check_password_hash
+    from app import app, json_dumps, live_session_xlsx
+    profile = {"Practica-1.json": {"problemas": {"1": {"respuesta": {"texto": "ñ", "fecha": dt.datetime(2025, 1, 1)}, "chats": []}}}}
+    report = [{"Estudiante": "a@uabc.edu.mx", "Práctica": "Practica-1.json", "Perfil": "Autorregulado"}]
+    body = b'{"ok": true}' * 1000
+    pw_hash = generate_password_hash("x")
+    with app.app_context():
+        expected_json = app.json.dumps(profile)
+    return [
+        ("generate_password_hash", (generate_password_hash, "x"), lambda r: check_password_hash(r, "x")),
+        ("check_password_hash", (check_password_hash, pw_hash, "x"), lambda r: r is True),
+        ("gzip.compress", (gzip.compress, body), lambda r: gzip.decompress(r) == body),
+        ("json_dumps (student-profile)", (json_dumps, profile), lambda r: r == expected_json),
+        ("live_session_xlsx", (live_session_xlsx, report), lambda r: r[:2] == b"PK"),
+    ]
+
+if __name__ == "__main__":
+    from app import run_cpu, cpu_pool
+    failures = []
+    for label, (fn, *args), ok in cases():
+        try:
+            passed = ok(run_cpu(fn, *args))
+        except Exception as e:
+            passed = False
+            print(f"   {type(e).__name__}: {e}")
+        print(f"{'✅' if passed else '❌'} {label}")
+        if not passed:
+            failures.append(label)
+    print(cpu_pool.stats())
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,32 @@
+import os, sys, subprocess, tempfile
+
+# Imports app.py in a fresh interpreter and fails if it takes longer than IMPORT_TIME_BUDGET_SECONDS,
+# or if a dependency that must stay lazy (Pinecone client, pandas) got imported on the way.
+# Usage: python check_import_time.py   (uses a throwaway SQLite DB, never DATABASE_URL; exit code 1 on failure)
+
+LAZY_MODULES = ("pinecone", "pandas")
+
+PROBE = f"""
+import sys, json, app
+print(json.dumps({{"elapsed": app._import_elapsed, "budget": app.IMPORT_TIME_BUDGET_SECONDS,
+                  "eager": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+"""
+
+if __name__ == "__main__":
+    import json
+    env = dict(os.environ, DATABASE_URL="sqlite:///" + os.path.join(tempfile.mkdtemp(), "check.db"))
+    proc = subprocess.run([sys.executable, "-c", PROBE], cwd=os.path.dirname(os.path.abspath(__file__)),
+                          env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(proc.stderr)
+        sys.exit(1)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    failures = []
+    if result["elapsed"] > result["budget"]:
+        failures.append(f"import tomó {result['elapsed']:.2f}s (presupuesto: {result['budget']:.2f}s)")
+    if result["eager"]:
+        failures.append(f"importados al arrancar: {', '.join(result['eager'])}")
+    print(f"{'❌' if failures else '✅'} import app: {result['elapsed']:.2f}s / {result['budget']:.2f}s")
+    for failure in failures:
+        print(f"   {failure}")
+    sys.exit(1 if failures else 0)
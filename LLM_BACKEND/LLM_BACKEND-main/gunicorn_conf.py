@@ -1,6 +1,12 @@
 # gunicorn_conf.py
+import os
 import gevent.monkey
 gevent.monkey.patch_all()
 worker_class = 'geventwebsocket.gunicorn.workers.GeventWebSocketWorker'
-workers = 1
-bind = '0.0.0.0:8080'
\ No newline at end of file
+# Más de un worker exige SOCKETIO_MESSAGE_QUEUE (Redis): los emits y la presencia viajan por ahí.
+# gunicorn reparte conexiones sin afinidad, por eso los clientes Socket.IO usan solo websocket.
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+if workers > 1 and not os.getenv("SOCKETIO_MESSAGE_QUEUE"):
+    print("⚠️ GUNICORN_WORKERS > 1 sin SOCKETIO_MESSAGE_QUEUE: se usará un solo worker")
+    workers = 1
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8080')}")
@@ -1,7 +1,9 @@
 import gevent.monkey
 gevent.monkey.patch_all()
+import sys
 import warnings
 from app import app, db
+from migrations import run_migrations, explain_hot_queries
 from sqlalchemy import text
 warnings.simplefilter("ignore")
 
@@ -10,6 +12,20 @@ def init_database():
         print("Creating database tables...")
         db.create_all()
         print("Tables created successfully!")
-        
+        print("Applying migrations...")
+        run_migrations()
+        print("Migrations applied successfully!")
+
+def check_query_plans():
+    with app.app_context():
+        failures = explain_hot_queries()
+    if failures:
+        print(f"Full table scans detected in: {', '.join(failures)}")
+        sys.exit(1)
+    print("All hot queries use an index.")
+
 if __name__ == "__main__":
-    init_database()
\ No newline at end of file
+    if "--explain" in sys.argv:
+        check_query_plans()
+    else:
+        init_database()
@@ -0,0 +1,248 @@
+import datetime as dt
+from sqlalchemy import Index, MetaData, Table, case, create_engine, func, inspect, select, text
+from sqlalchemy.orm import Session
+from app import (
+    db, hora_ensenada, upsert_rows, refresh_progress_scores, ChatLog, RespuestaUsuario, AnalisisInteraccion, ListaClase,
+    EstadoEstudiante, ChatLogArchive, AnalisisInteraccionArchive, ProgresoPractica, PROGRESS_COUNTERS, CHAT_FTS_TABLE,
+    LAST_MESSAGE_MAX_CHARS,
+)
+
+# ------------------------------------------------------------------------------------
+# Versioned Migrations
+# ------------------------------------------------------------------------------------
+# db.create_all() only creates missing tables; it never touches tables that already
+# exist in production. Every schema change after the initial dump goes here as a new
+# numbered step. Steps must be idempotent (checkfirst) so a fresh database built by
+# create_all() can run them as no-ops.
+
+SCHEMA_VERSION_TABLE = "railway_schema_version"
+
+def _create_indexes(conn, table_name, indexes):
+    existing = {ix["name"] for ix in inspect(conn).get_indexes(table_name)}
+    table = Table(table_name, MetaData(), autoload_with=conn)
+    for name, columns in indexes:
+        if name in existing:
+            continue
+        print(f"   + {table_name}.{name} ({', '.join(columns)})")
+        Index(name, *[table.c[c] for c in columns]).create(conn)
+
+def _0001_hot_query_indexes(conn):
+    # history_for_chat / background_llm_task / dashboard-data / student-profile
+    _create_indexes(conn, "railway_chat_log", [
+        ("ix_chat_log_student_problem", ["correo_identificacion", "practice_name", "problema_id", "created_at"]),
+        ("ix_chat_log_student_time", ["correo_identificacion", "created_at"]),
+    ])
+    # grades pending/completed, dashboard-data, live session report
+    _create_indexes(conn, "railway_respuesta_usuario", [
+        ("ix_respuesta_student_practice_status", ["correo_identificacion", "practice_name", "status", "created_at"]),
+        ("ix_respuesta_student_time", ["correo_identificacion", "created_at"]),
+    ])
+    # semaphore sliding window, timeline, live session report
+    _create_indexes(conn, "railway_analisis_interaccion", [
+        ("ix_analisis_student_time", ["correo_identificacion", "created_at"]),
+    ])
+    # my-teachers / my-active-exercises look up the roster by student
+    _create_indexes(conn, "railway_lista_clase", [
+        ("ix_lista_clase_student", ["student_email"]),
+    ])
+    _create_indexes(conn, "railway_reporte_desempeno", [
+        ("ix_reporte_student_practice", ["student_email", "practice_name"]),
+    ])
+
+def _0002_student_status_table(conn):
+    EstadoEstudiante.__table__.create(conn, checkfirst=True)
+    if conn.execute(select(func.count()).select_from(EstadoEstudiante.__table__)).scalar():
+        return
+    # Backfill with each student's latest analysis (one-off version of the old /api/teacher/status query)
+    latest = select(
+        AnalisisInteraccion.correo_identificacion.label("email"),
+        func.max(AnalisisInteraccion.created_at).label("max_date"),
+    ).group_by(AnalisisInteraccion.correo_identificacion).subquery()
+    rows = conn.execute(select(
+        AnalisisInteraccion.correo_identificacion, AnalisisInteraccion.color_asignado,
+        AnalisisInteraccion.intent, AnalisisInteraccion.created_at,
+    ).join(latest, (AnalisisInteraccion.correo_identificacion == latest.c.email) & (AnalisisInteraccion.created_at == latest.c.max_date))).all()
+    seen = {}
+    for email, color, intent, created_at in rows:
+        if email:
+            seen[email] = {"student_email": email, "color": color, "last_intent": intent, "last_activity": created_at, "progress_pct": 0.0}
+    if seen:
+        conn.execute(EstadoEstudiante.__table__.insert(), list(seen.values()))
+
+def _0003_archive_tables(conn):
+    for model in (ChatLogArchive, AnalisisInteraccionArchive):
+        model.__table__.create(conn, checkfirst=True)
+        _create_indexes(conn, model.__tablename__, [(ix.name, [c.name for c in ix.columns]) for ix in model.__table__.indexes])
+
+def _0004_progress_summary_table(conn):
+    ProgresoPractica.__table__.create(conn, checkfirst=True)
+    _create_indexes(conn, ProgresoPractica.__tablename__, [(ix.name, [c.name for c in ix.columns]) for ix in ProgresoPractica.__table__.indexes])
+    if conn.execute(select(func.count()).select_from(ProgresoPractica.__table__)).scalar():
+        return
+    with Session(bind=conn) as session:
+        # Contadores de chat y semáforo de ambos niveles (caliente + archivo) sumados antes de un solo upsert,
+        # para que last_activity sea el máximo de los dos y no el del último nivel recorrido
+        counters = {}
+        for chat_model, analysis_model in ((ChatLog, AnalisisInteraccion), (ChatLogArchive, AnalisisInteraccionArchive)):
+            for email, practice, turns, last in session.execute(select(
+                chat_model.correo_identificacion, chat_model.practice_name,
+                func.count(chat_model.id), func.max(chat_model.created_at),
+            ).where(chat_model.role == "user").group_by(chat_model.correo_identificacion, chat_model.practice_name)):
+                row = counters.setdefault((email, practice), {"chat_turns": 0, "red_count": 0, "yellow_count": 0, "last_activity": None})
+                row["chat_turns"] += turns
+                if last is not None and (row["last_activity"] is None or last > row["last_activity"]):
+                    row["last_activity"] = last
+            for email, practice, red, yellow in session.execute(select(
+                chat_model.correo_identificacion, chat_model.practice_name,
+                func.sum(case((analysis_model.color_asignado == "red", 1), else_=0)),
+                func.sum(case((analysis_model.color_asignado == "yellow", 1), else_=0)),
+            ).join(chat_model, chat_model.id == analysis_model.chat_id).group_by(chat_model.correo_identificacion, chat_model.practice_name)):
+                row = counters.setdefault((email, practice), {"chat_turns": 0, "red_count": 0, "yellow_count": 0, "last_activity": None})
+                row["red_count"] += int(red or 0)
+                row["yellow_count"] += int(yellow or 0)
+        rows = [{"student_email": e, "practice_name": p, **c} for (e, p), c in counters.items() if e and p]
+        for start in range(0, len(rows), 1000):
+            upsert_rows(ProgresoPractica, rows[start:start + 1000], ["student_email", "practice_name"], ["last_activity"],
+                        session=session, increment_cols=list(PROGRESS_COUNTERS))
+        keys = session.execute(select(RespuestaUsuario.correo_identificacion, RespuestaUsuario.practice_name).distinct()).all()
+        refresh_progress_scores(keys, session=session)
+        session.commit()
+
+def _0005_chat_fulltext_index(conn):
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        if "ft_chat_log_content" not in {ix["name"] for ix in inspect(conn).get_indexes("railway_chat_log")}:
+            print("   + railway_chat_log.ft_chat_log_content FULLTEXT (content)")
+            conn.execute(text("ALTER TABLE railway_chat_log ADD FULLTEXT INDEX ft_chat_log_content (content)"))
+    elif dialect == "sqlite":
+        # Índice invertido externo (FTS5) sincronizado por triggers con railway_chat_log
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {CHAT_FTS_TABLE} USING fts5("
+            "content, content='railway_chat_log', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS railway_chat_log_fts_ai AFTER INSERT ON railway_chat_log BEGIN "
+            f"INSERT INTO {CHAT_FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS railway_chat_log_fts_ad AFTER DELETE ON railway_chat_log BEGIN "
+            f"INSERT INTO {CHAT_FTS_TABLE}({CHAT_FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS railway_chat_log_fts_au AFTER UPDATE OF content ON railway_chat_log BEGIN "
+            f"INSERT INTO {CHAT_FTS_TABLE}({CHAT_FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); "
+            f"INSERT INTO {CHAT_FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END"
+        ))
+        conn.execute(text(f"INSERT INTO {CHAT_FTS_TABLE}({CHAT_FTS_TABLE}) VALUES ('rebuild')"))
+
+def _0006_student_status_last_message(conn):
+    if "last_message" not in {c["name"] for c in inspect(conn).get_columns(EstadoEstudiante.__tablename__)}:
+        print(f"   + {EstadoEstudiante.__tablename__}.last_message")
+        conn.execute(text(f"ALTER TABLE {EstadoEstudiante.__tablename__} ADD COLUMN last_message VARCHAR(500)"))
+    # Backfill con el último mensaje de cada alumno (solo nivel caliente: el archivo es historia vieja)
+    latest = select(
+        ChatLog.correo_identificacion.label("email"), func.max(ChatLog.created_at).label("max_date"),
+    ).where(ChatLog.role == "user").group_by(ChatLog.correo_identificacion).subquery()
+    seen = {}
+    for email, content, created_at in conn.execute(select(
+        ChatLog.correo_identificacion, ChatLog.content, ChatLog.created_at,
+    ).join(latest, (ChatLog.correo_identificacion == latest.c.email) & (ChatLog.created_at == latest.c.max_date)).where(ChatLog.role == "user")):
+        if email:
+            seen[email] = {"student_email": email, "last_message": (content or "")[:LAST_MESSAGE_MAX_CHARS], "last_activity": created_at}
+    rows = list(seen.values())
+    with Session(bind=conn) as session:
+        for start in range(0, len(rows), 1000):
+            upsert_rows(EstadoEstudiante, rows[start:start + 1000], ["student_email"], ["last_message"], session=session)
+        session.commit()
+
+MIGRATIONS = [
+    (1, "Composite indexes for hot chat/answer/semaphore queries", _0001_hot_query_indexes),
+    (2, "Materialized per-student status table", _0002_student_status_table),
+    (3, "Cold-tier archive tables for chat log and analyses", _0003_archive_tables),
+    (4, "Per student/practice progress summary table", _0004_progress_summary_table),
+    (5, "Full-text index on chat log content", _0005_chat_fulltext_index),
+    (6, "Last chat message on the per-student status table", _0006_student_status_last_message),
+]
+
+def run_migrations(engine=None):
+    """Applies every migration newer than the recorded schema version."""
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} ("
+            "version INTEGER PRIMARY KEY, description VARCHAR(255), applied_at DATETIME)"
+        ))
+        applied = {row[0] for row in conn.execute(text(f"SELECT version FROM {SCHEMA_VERSION_TABLE}"))}
+    for version, description, step in MIGRATIONS:
+        if version in applied:
+            continue
+        print(f"Applying migration {version:04d}: {description}")
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(
+                text(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": hora_ensenada()},
+            )
+
+# ------------------------------------------------------------------------------------
+# Query Plan Check
+# ------------------------------------------------------------------------------------
+
+def _hot_queries():
+    now = dt.datetime(2025, 1, 1)
+    emails = ["a@uabc.edu.mx", "b@uabc.edu.mx"]
+    practices = ["Practica-4-POO.json", "AA-2025-Examen-3.json"]
+    return {
+        "history_for_chat": select(ChatLog).where(
+            ChatLog.correo_identificacion == emails[0], ChatLog.practice_name == practices[0],
+            ChatLog.problema_id == 1, ChatLog.created_at >= now,
+        ).order_by(ChatLog.created_at.asc()),
+        "dashboard_chats": select(ChatLog).where(
+            ChatLog.correo_identificacion.in_(emails), ChatLog.practice_name.in_(practices),
+        ).order_by(ChatLog.created_at.desc()).limit(500),
+        "live_session_chats": select(ChatLog).where(
+            ChatLog.correo_identificacion.in_(emails), ChatLog.created_at >= now, ChatLog.created_at <= now,
+        ),
+        "semaphore_window": select(AnalisisInteraccion).where(
+            AnalisisInteraccion.correo_identificacion == emails[0], AnalisisInteraccion.created_at >= now,
+        ).order_by(AnalisisInteraccion.created_at.desc()),
+        "teacher_grades": select(RespuestaUsuario).where(
+            RespuestaUsuario.correo_identificacion.in_(emails), RespuestaUsuario.practice_name.in_(practices),
+            RespuestaUsuario.status.in_(["approved", "edited"]),
+        ).order_by(RespuestaUsuario.created_at.desc()),
+        "live_session_answers": select(RespuestaUsuario).where(
+            RespuestaUsuario.correo_identificacion.in_(emails),
+            RespuestaUsuario.created_at >= now, RespuestaUsuario.created_at <= now,
+        ),
+        "student_teachers": select(ListaClase).where(ListaClase.student_email == emails[0]),
+        "teacher_snapshot": select(ListaClase.student_email, EstadoEstudiante).outerjoin(
+            EstadoEstudiante, EstadoEstudiante.student_email == ListaClase.student_email,
+        ).where(ListaClase.profesor_id == 1),
+        "class_overview": select(ProgresoPractica).where(
+            ProgresoPractica.student_email.in_(emails), ProgresoPractica.practice_name.in_(practices),
+        ),
+        "archive_probe": select(ChatLogArchive.id).where(ChatLogArchive.correo_identificacion == emails[0]).limit(1),
+        "archive_student_chats": select(ChatLogArchive).where(
+            ChatLogArchive.correo_identificacion == emails[0], ChatLogArchive.practice_name.in_(practices),
+        ).order_by(ChatLogArchive.problema_id, ChatLogArchive.created_at),
+    }
+
+def explain_hot_queries():
+    """Builds the schema in an in-memory SQLite DB and fails if a hot query does a full table scan."""
+    engine = create_engine("sqlite://")
+    # Start from the pre-migration schema (tables without secondary indexes), like production
+    baseline = MetaData()
+    for table in db.metadata.sorted_tables:
+        table.to_metadata(baseline).indexes.clear()
+    baseline.create_all(engine)
+    run_migrations(engine)
+    failures = []
+    with engine.connect() as conn:
+        for name, stmt in _hot_queries().items():
+            sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+            plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+            full_scans = [step for step in plan if step.startswith("SCAN") and "INDEX" not in step]
+            print(f"{'❌' if full_scans else '✅'} {name}: {' | '.join(plan)}")
+            if full_scans:
+                failures.append(name)
+    return failures
@@ -1,5 +1,6 @@
 import flet as ft
 import requests, time, threading, os, json
+from collections import OrderedDict, deque
 import socketio
 
 BASE                    = os.getenv("BACKEND_BASE_URL", "http://localhost:8000")
@@ -118,7 +119,30 @@ def add_to_pending_queue(page, item: dict):
     queue = load_k(page, STATE_KEYS["pending_queue"], []) or []
     queue.append(item)
     save_k(page, STATE_KEYS["pending_queue"], queue)
-    
+
+# Conditional GET cache: unchanged payloads come back as 304 and reuse the stored response
+HTTP_CACHE_MAX_ENTRIES = 128
+_http_cache = OrderedDict()
+_http_cache_lock = threading.Lock()
+
+def cached_get(url, **kwargs):
+    headers = dict(kwargs.pop("headers", None) or {})
+    key = (url, json.dumps(kwargs.get("params") or {}, sort_keys=True), headers.get("Authorization", ""))
+    with _http_cache_lock:
+        cached = _http_cache.get(key)
+    if cached is not None:
+        headers["If-None-Match"] = cached.headers["ETag"]
+    res = requests.get(url, headers=headers, **kwargs)
+    if res.status_code == 304 and cached is not None:
+        return cached
+    if res.status_code == 200 and res.headers.get("ETag"):
+        with _http_cache_lock:
+            _http_cache[key] = res
+            _http_cache.move_to_end(key)
+            while len(_http_cache) > HTTP_CACHE_MAX_ENTRIES:
+                _http_cache.popitem(last=False)
+    return res
+
 def main(page: ft.Page):
     theme_name = load_k(page, "theme", "dark")
     COLORES = DARK_COLORS.copy() if theme_name == "dark" else LIGHT_COLORS.copy()
@@ -126,8 +150,10 @@ def main(page: ft.Page):
         "token": load_k(page, "student_token"),
         "correo": load_k(page, "correo_identificacion"),
         "nombre": load_k(page, "student_name", "Estudiante"),
-        "teachers_list": []
+        "teachers_list": [],
+        "last_seq": None,
     }
+    seen_seqs = deque(maxlen=500)
     
     page.is_alive = True
     sio = socketio.Client()
@@ -141,21 +167,55 @@ def main(page: ft.Page):
         try:
             url = f"{BASE}{endpoint}"
             if "timeout" not in kwargs: kwargs["timeout"] = 30
-            if method == "GET": return requests.get(url, **kwargs)
+            if method == "GET": return cached_get(url, **kwargs)
             if method == "POST": return requests.post(url, **kwargs)
         except Exception as e:
             print(f"Error request: {e}")
             return None
             
+    def is_new_event(data):
+        # El servidor numera los eventos de la sala ("seq"); tras reconectar pueden llegar repetidos
+        seq = data.get('seq')
+        if seq is None:
+            return True
+        if seq in seen_seqs:
+            return False
+        seen_seqs.append(seq)
+        state["last_seq"] = max(seq, state["last_seq"] or 0)
+        return True
+
     page.on_bot_message = lambda data: None
     @sio.on('nuevo_mensaje_bot')
     def on_nuevo_mensaje(data):
-        if data['correo'] == state["correo"]:
+        if data['correo'] == state["correo"] and is_new_event(data):
             page.on_bot_message(data)
-    try:
-        sio.connect(BASE)
-    except Exception as e:
-        print("Error conectando sockets en el chat:", e)
+
+    page.on_replay_reset = lambda: None
+    @sio.on('replay')
+    def on_replay(data):
+        """Events emitted while the socket was down, or reset=True if the server no longer has them."""
+        if data.get('reset'):
+            seen_seqs.clear()
+            page.on_replay_reset()
+        for item in data.get('events', []):
+            handler = {'nuevo_mensaje_bot': on_nuevo_mensaje, 'teacher_alert': on_teacher_alert}.get(item['event'])
+            if handler:
+                handler(item['data'])
+        state["last_seq"] = data.get('last_seq')
+
+    def connect_socket():
+        # El servidor asigna la sala del alumno a partir del JWT: hay que reconectar al cambiar de sesión
+        try:
+            if sio.connected:
+                sio.disconnect()
+            state["last_seq"] = None
+            seen_seqs.clear()
+            if state["token"]:
+                # auth se evalúa en cada reconexión: así el servidor sabe desde qué seq reenviar
+                sio.connect(BASE, auth=lambda: {"token": state["token"], "last_seq": state["last_seq"]}, transports=["websocket"])
+        except Exception as e:
+            print("Error conectando sockets en el chat:", e)
+    connect_socket()
         
     try:
         last_heartbeat = page.client_storage.get("last_heartbeat")
@@ -186,7 +246,7 @@ def main(page: ft.Page):
     page.on_teacher_alert = lambda data: None
     @sio.on('teacher_alert')
     def on_teacher_alert(data):
-        if data['student_email'] == state["correo"]:
+        if data['student_email'] == state["correo"] and is_new_event(data):
             page.on_teacher_alert(data)
             
     def handle_teacher_alert(data):
@@ -332,7 +392,7 @@ def main(page: ft.Page):
         
         if is_register:
             try:
-                res = requests.get(f"{BASE}/api/public/teachers", timeout=10)
+                res = cached_get(f"{BASE}/api/public/teachers", timeout=10)
                 if res.status_code == 200:
                     state["teachers_list"] = res.json()
                     teacher_dropdown.options = [ft.dropdown.Option(key=str(t["id"]), text=f"{t['nombre']} ({t['email']})") for t in state["teachers_list"]]
@@ -375,6 +435,7 @@ def main(page: ft.Page):
                     page.client_storage.set("student_token", state["token"])
                     page.client_storage.set("correo_identificacion", state["correo"])
                     page.client_storage.set("student_name", state["nombre"])
+                    connect_socket()
                     flash(f"Bienvenido, {state['nombre']}", ok=True)
                     show_student_dashboard()
                 else:
@@ -650,7 +711,7 @@ def main(page: ft.Page):
                 ft.Row([ft.Icon(ft.Icons.SCHOOL, color=COLORES["primario"], size=30), ft.Text(f"Portal de Alumnos - {state['nombre']}", size=24, weight="bold", color=COLORES["texto"])]),
                 ft.Row([
                     ft.IconButton(icon=ft.Icons.LIGHT_MODE if theme_name == "dark" else ft.Icons.DARK_MODE, icon_color=COLORES["primario"], on_click=toggle_theme, tooltip="Cambiar Tema"),
-                    ft.IconButton(icon=ft.Icons.LOGOUT, icon_color=COLORES["error"], tooltip="Cerrar Sesión", on_click=lambda e: (page.client_storage.remove("student_token"), state.update({"token": None, "correo": None, "nombre": None}), show_login_register()))
+                    ft.IconButton(icon=ft.Icons.LOGOUT, icon_color=COLORES["error"], tooltip="Cerrar Sesión", on_click=lambda e: (page.client_storage.remove("student_token"), state.update({"token": None, "correo": None, "nombre": None}), connect_socket(), show_login_register()))
                 ])
             ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
             padding=20, bgcolor=COLORES["fondo"], border=ft.border.only(bottom=ft.border.BorderSide(1, COLORES["borde"]))
@@ -801,7 +862,21 @@ def main(page: ft.Page):
                 except Exception:
                     pass
                     
+        def handle_replay_reset():
+            # La respuesta pendiente se perdió durante la desconexión: no dejar "Escribiendo..." para siempre
+            if getattr(page, "burbuja_carga", None) in chat_area.controls:
+                chat_area.controls.remove(page.burbuja_carga)
+                page.burbuja_carga = None
+                page.polling_speed = "slow"
+                flash("Se perdió la conexión. Si no ves la respuesta, envía tu mensaje de nuevo.", ok=False)
+                try:
+                    if page.is_alive:
+                        page.update()
+                except Exception:
+                    pass
+
         page.on_bot_message = handle_bot_message # Bind the socket to this screen
+        page.on_replay_reset = handle_replay_reset
         page.on_keyboard_event = on_global_keyboard
         problema_actual_id = 1
         NUM_PROBLEMAS = len(PROBLEMAS)
@@ -1,5 +1,6 @@
 import flet as ft
 import requests, time, threading, os, json
+from collections import OrderedDict, deque
 import socketio
 import datetime as dt
 from zoneinfo import ZoneInfo
@@ -67,6 +68,29 @@ STATE_KEYS = {
     "pending_queue":    "pending_queue_list",
 }
 
+# Conditional GET cache: unchanged payloads come back as 304 and reuse the stored response
+HTTP_CACHE_MAX_ENTRIES = 128
+_http_cache = OrderedDict()
+_http_cache_lock = threading.Lock()
+
+def cached_get(url, **kwargs):
+    headers = dict(kwargs.pop("headers", None) or {})
+    key = (url, json.dumps(kwargs.get("params") or {}, sort_keys=True), headers.get("Authorization", ""))
+    with _http_cache_lock:
+        cached = _http_cache.get(key)
+    if cached is not None:
+        headers["If-None-Match"] = cached.headers["ETag"]
+    res = requests.get(url, headers=headers, **kwargs)
+    if res.status_code == 304 and cached is not None:
+        return cached
+    if res.status_code == 200 and res.headers.get("ETag"):
+        with _http_cache_lock:
+            _http_cache[key] = res
+            _http_cache.move_to_end(key)
+            while len(_http_cache) > HTTP_CACHE_MAX_ENTRIES:
+                _http_cache.popitem(last=False)
+    return res
+
 def main(page: ft.Page):
     ui_lock = threading.Lock()
     state = {
@@ -76,6 +100,7 @@ def main(page: ft.Page):
         "dashboard_data": {},
         "my_exercises": [],
         "all_exercises": [],
+        "last_seq": None,
     }
     
     def on_disconnect(e):
@@ -117,6 +142,7 @@ def main(page: ft.Page):
     
     page.overlay.append(save_snack)
     sio = socketio.Client()
+    seen_seqs = deque(maxlen=500)
     is_session_active = False
     student_cards_state = {}
     dashboard_grid = ft.GridView(expand=True, runs_count=5, max_extent=250, child_aspect_ratio=1.0, spacing=10, run_spacing=10)
@@ -296,11 +322,106 @@ def main(page: ft.Page):
     def disconnect():
         print("❌ Desconectado del servidor de tiempo real")
     
+    def set_card_presence(email, online, refresh=True):
+        card_data = student_cards_state.get(email)
+        if not card_data: return
+        card_data['online'] = online
+        card_control = card_data['control']
+        card_control.opacity = 1.0 if online else 0.55
+        card_control.tooltip = "En línea" if online else "Sin conexión"
+        try:
+            if refresh and card_control.page:
+                card_control.update()
+        except AssertionError:
+            pass
+
+    def hydrate_snapshot():
+        """Color, progress, last message and presence of the whole roster in one request; socket deltas follow."""
+        res = auth_request("GET", "/api/teacher/snapshot")
+        if not res or res.status_code != 200:
+            return
+        data = res.json()
+        for stu in data.get("students", []):
+            if stu.get("last_activity"):
+                apply_student_activity({
+                    'type': 'snapshot', 'student_email': stu["email"], 'status': stu.get("color") or 'green',
+                    'progress_pct': stu.get("progress_pct") or 0.0, 'last_message': stu.get("last_message"),
+                    'timestamp': stu["last_activity"],
+                }, refresh=False)
+            set_card_presence(stu["email"], stu.get("online", False), refresh=False)
+        if not sio.connected:
+            # Al conectar, el servidor reenvía lo emitido después de la foto
+            state["last_seq"] = data.get("seq")
+        page.update()
+
+    def activity_text(data, prog_pct):
+        if data.get('type') == 'answer':
+            return f"Entregó P{data.get('problem_id', '?')} ({(prog_pct*100):.0f}%)"
+        if data.get('type') == 'snapshot':
+            return f"Última actividad {(data.get('timestamp') or '')[11:16]} ({(prog_pct*100):.0f}%)"
+        return f"Conversando ({(prog_pct*100):.0f}%)"
+
+    def is_new_event(data):
+        # El servidor numera los eventos de la sala ("seq"); tras reconectar pueden llegar repetidos
+        seq = data.get('seq')
+        if seq is None:
+            return True
+        if seq in seen_seqs:
+            return False
+        seen_seqs.append(seq)
+        state["last_seq"] = max(seq, state["last_seq"] or 0)
+        return True
+
+    @sio.event
+    def replay(data):
+        """Events emitted while the socket was down, or reset=True if the server no longer has them."""
+        if data.get('reset'):
+            seen_seqs.clear()
+            threading.Thread(target=hydrate_snapshot, daemon=True).start()
+        # Se aplican directo (sin pasar por los handlers en vivo): un solo refresco y a lo más un ack al final
+        replayed_batch = False
+        for item in data.get('events', []):
+            event, payload = item['event'], item['data']
+            if not is_new_event(payload):
+                continue
+            if event == 'student_presence':
+                set_card_presence(payload.get('student_email'), payload.get('online', False), refresh=False)
+            elif event == 'student_activity' and is_session_active:
+                apply_student_activity(payload, refresh=False)
+            elif event == 'student_activity_batch':
+                replayed_batch = True
+                if is_session_active:
+                    for activity in payload.get('items', []):
+                        apply_student_activity(activity, refresh=False)
+        state["last_seq"] = data.get('last_seq')
+        page.update()
+        if replayed_batch:
+            sio.emit('activity_ack', {})
+
+    @sio.event
+    def student_presence(data):
+        """A student opened their first or closed their last socket."""
+        if not is_new_event(data): return
+        set_card_presence(data.get('student_email'), data.get('online', False))
+
     @sio.event
     def student_activity(data):
         """Handles real-time updates from backend servers."""
-        if not is_session_active: return
-    
+        if not is_session_active or not is_new_event(data): return
+        apply_student_activity(data)
+
+    @sio.event
+    def student_activity_batch(data):
+        """Latest state per student for the last frame; the ack lets the server send the next one."""
+        try:
+            if is_session_active and is_new_event(data):
+                for item in data.get('items', []):
+                    apply_student_activity(item, refresh=False)
+                page.update()
+        finally:
+            sio.emit('activity_ack', {})
+
+    def apply_student_activity(data, refresh=True):
         email = data.get('student_email')
         status_color = data.get('status', 'green')
         prog_pct = data.get('progress_pct', 0.0)
@@ -330,15 +451,12 @@ def main(page: ft.Page):
             status_icon_control.color = icon_data[1]
             bar_ctrl.value = prog_pct
             
-            if data.get('type') == 'answer':
-                txt_ctrl.value = f"Entregó P{data.get('problem_id', '?')} ({(prog_pct*100):.0f}%)"
-            else:
-                txt_ctrl.value = f"Conversando ({(prog_pct*100):.0f}%)"
+            txt_ctrl.value = activity_text(data, prog_pct)
             
             card_data['latest_data'] = data
             
             try:
-                if card_control.page:
+                if refresh and card_control.page:
                     bar_ctrl.update()
                     txt_ctrl.update()
                     card_control.update()
@@ -402,7 +520,7 @@ def main(page: ft.Page):
         try:
             url = f"{BASE}{endpoint}"
             if "timeout" not in kwargs: kwargs["timeout"] = 30
-            if method == "GET": return requests.get(url, **kwargs)
+            if method == "GET": return cached_get(url, **kwargs)
             if method == "POST": return requests.post(url, **kwargs)
             if method == "DELETE": return requests.delete(url, **kwargs)
         except Exception as e:
@@ -693,6 +811,45 @@ def main(page: ft.Page):
                 flash("Error al agregar estudiante", ok=False)
             load_students()
             
+        roster_import_field = ft.TextField(
+            label="Pega correos o el contenido de un CSV (columna email/correo)",
+            multiline=True, min_lines=8, max_lines=12, text_size=12, expand=True
+        )
+        
+        def import_roster_action(e):
+            content = roster_import_field.value.strip()
+            if not content:
+                flash("La lista está vacía", ok=False)
+                return
+            e.control.disabled = True
+            page.update()
+            res = auth_request("POST", "/api/teacher/students/import", data=content.encode("utf-8"), headers={"Content-Type": "text/csv"})
+            if res and res.status_code == 200:
+                r = res.json()
+                flash(f"Agregados: {r['added']} | Omitidos: {r['skipped']} | Inválidos: {r['invalid']}", ok=r["invalid"] == 0)
+                roster_import_dlg.open = False
+                roster_import_field.value = ""
+                load_students()
+            else:
+                msg = res.json().get("msg") if res is not None and res.headers.get("Content-Type", "").startswith("application/json") else None
+                flash(msg or "Error al importar la lista", ok=False)
+            e.control.disabled = False
+            page.update()
+            
+        roster_import_dlg = ft.AlertDialog(
+            title=ft.Row([ft.Icon(ft.Icons.UPLOAD_FILE, color=COLORES["primario"]), ft.Text("Importar lista de clase")]),
+            content=ft.Container(content=roster_import_field, width=500, height=260),
+            actions=[
+                ft.TextButton("Cancelar", on_click=lambda e: setattr(roster_import_dlg, 'open', False) or page.update()),
+                ft.ElevatedButton("Importar", bgcolor=COLORES["primario"], color=COLORES["fondo"], on_click=import_roster_action)
+            ]
+        )
+        page.overlay.append(roster_import_dlg)
+        
+        def open_roster_import(e):
+            roster_import_dlg.open = True
+            page.update()
+            
         def delete_student(e, email):
             e.control.disabled = True
             page.update()
@@ -787,6 +944,7 @@ def main(page: ft.Page):
                         content=ft.Column([
                             ft.Row([
                                 ft.Text("Lista de estudiantes inscritos", size=20, color=COLORES["primario"], expand=True, text_align=ft.TextAlign.CENTER),
+                                ft.IconButton(ft.Icons.UPLOAD_FILE, icon_color=COLORES["primario"], icon_size=20, tooltip="Importar lista", on_click=open_roster_import),
                                 ft.IconButton(ft.Icons.REFRESH, icon_color=COLORES["primario"], icon_size=20, tooltip="Refrescar", on_click=refresh_students)
                             ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
                             ft.Row([search_my_students, sort_btn_my], spacing=5),
@@ -976,7 +1134,7 @@ def main(page: ft.Page):
                 r1 = requests.get(f"{BASE}/api/teacher/my-exercises", headers=headers)
                 if r1.status_code == 200:
                     state["my_exercises"] = r1.json()
-                r2 = requests.get(f"{BASE}/api/exercises/available", headers=headers)
+                r2 = cached_get(f"{BASE}/api/exercises/available", headers=headers)
                 if r2.status_code == 200:
                     state["all_exercises"] = r2.json()
                 render_exercises()
@@ -1280,38 +1438,159 @@ def main(page: ft.Page):
                     pass
                 page.update()
                 
-        def load_data_filtered(e=None):
-            if e and hasattr(e, 'control'):
-                e.control.disabled = True
-                page.update()
-            reset_inactivity_timer()
+        state["monitor"] = {"params": {}, "respuestas": [], "chats": [], "next_cursor": {"respuestas": None, "chats": None}}
+        MONITOR_CURSOR_PARAMS = {"respuestas": "resp_cursor", "chats": "chat_cursor"}
+        MONITOR_REFRESH_MAX_PAGES = 20
+        
+        def monitor_params():
             params = {}
             if student_filter.value != "Todos los estudiantes":
                 params["student_email"] = student_filter.value
             if exercise_filter.value != "Todas las tareas":
                 params["practice_name"] = exercise_filter.value
-                if problem_filter.value != "Todos los ejercicios" and problem_filter.value is not None:
-                    pass
+                if problem_filter.value and problem_filter.value.isdigit():
+                    params["problema_id"] = problem_filter.value
+            return params
+                
+        def load_data_filtered(e=None):
+            if e and hasattr(e, 'control'):
+                e.control.disabled = True
+                page.update()
+            reset_inactivity_timer()
+            params = monitor_params()
             res = auth_request("GET", "/api/teacher/dashboard-data", params=params)
             if res and res.status_code == 200:
-                render_data(res.json())
+                data = res.json()
+                state["monitor"] = {
+                    "params": params,
+                    "respuestas": data.get("respuestas", []),
+                    "chats": data.get("chats", []),
+                    "next_cursor": data.get("next_cursor", {"respuestas": None, "chats": None}),
+                }
+                render_data()
             if e and hasattr(e, 'control'):
                 e.control.disabled = False
                 page.update()
                 
-        def render_data(data):
+        def load_older(kind):
+            # Trae la siguiente página (más antigua) de respuestas o chats bajo demanda
+            mon = state["monitor"]
+            cursor = mon["next_cursor"].get(kind)
+            if not cursor: return
+            params = dict(mon["params"], only=kind)
+            params[MONITOR_CURSOR_PARAMS[kind]] = cursor
+            res = auth_request("GET", "/api/teacher/dashboard-data", params=params)
+            if res and res.status_code == 200:
+                data = res.json()
+                mon[kind].extend(data.get(kind, []))
+                mon["next_cursor"][kind] = data.get("next_cursor", {}).get(kind)
+                render_data()
+                
+        def fetch_newer(kind, since):
+            """Everything created after `since`, newest first; None if it can't be fetched whole (error or too many pages)."""
+            nuevos, cursor = [], None
+            for _ in range(MONITOR_REFRESH_MAX_PAGES):
+                params = dict(state["monitor"]["params"], only=kind, since=since)
+                if cursor: params[MONITOR_CURSOR_PARAMS[kind]] = cursor
+                res = auth_request("GET", "/api/teacher/dashboard-data", params=params)
+                if not res or res.status_code != 200: return None
+                data = res.json()
+                nuevos.extend(data.get(kind, []))
+                cursor = data.get("next_cursor", {}).get(kind)
+                if not cursor: return nuevos
+            return None
+
+        def refresh_new(e=None):
+            # Refresco incremental: solo pide lo creado después del registro más reciente
+            reset_inactivity_timer()
+            mon = state["monitor"]
+            for kind in MONITOR_CURSOR_PARAMS:
+                nuevos = fetch_newer(kind, mon[kind][0]["cursor"]) if mon[kind] else None
+                if nuevos is not None:
+                    mon[kind] = nuevos + mon[kind]
+                    continue
+                # Lista vacía, demasiados nuevos o fallo a medias: recargar desde la primera página para no dejar huecos
+                res = auth_request("GET", "/api/teacher/dashboard-data", params=dict(mon["params"], only=kind))
+                if res and res.status_code == 200:
+                    data = res.json()
+                    mon[kind] = data.get(kind, [])
+                    mon["next_cursor"][kind] = data.get("next_cursor", {}).get(kind)
+            render_data()
+
+        # --- Búsqueda de texto completo en chats (usa los mismos filtros de alumno/tarea/ejercicio) ---
+        chat_search_field = ft.TextField(
+            label="Buscar en chats",
+            prefix_icon=ft.Icons.MANAGE_SEARCH,
+            border_color=COLORES["primario"],
+            color=COLORES["texto"],
+            text_size=12,
+            content_padding=10,
+            width=220,
+            on_submit=lambda e: search_chats(),
+        )
+        state["chat_search"] = {"resultados": [], "next_cursor": None}
+
+        def highlighted_spans(fragmento, resaltados):
+            spans, pos = [], 0
+            for start, end in resaltados:
+                if start > pos:
+                    spans.append(ft.TextSpan(fragmento[pos:start]))
+                spans.append(ft.TextSpan(fragmento[start:end], ft.TextStyle(weight=ft.FontWeight.BOLD, bgcolor=COLORES["advertencia"])))
+                pos = end
+            if pos < len(fragmento):
+                spans.append(ft.TextSpan(fragmento[pos:]))
+            return spans
+
+        def search_chats(more=False):
+            reset_inactivity_timer()
+            srch = state["chat_search"]
+            q = (chat_search_field.value or "").strip()
+            if not q:
+                load_data_filtered()
+                return
+            params = dict(monitor_params(), q=q)
+            if more and srch["next_cursor"]:
+                params["cursor"] = srch["next_cursor"]
+            res = auth_request("GET", "/api/teacher/search-chats", params=params)
+            if not res or res.status_code != 200:
+                msg = res.json().get("msg") if res is not None and res.headers.get("Content-Type", "").startswith("application/json") else None
+                flash(msg or "Error en la búsqueda", ok=False)
+                return
+            data = res.json()
+            srch["resultados"] = (srch["resultados"] if more else []) + data.get("resultados", [])
+            srch["next_cursor"] = data.get("next_cursor")
+            render_search_results(q)
+
+        def render_search_results(q):
+            with ui_lock:
+                srch = state["chat_search"]
+                total = f"{len(srch['resultados'])}{'+' if srch['next_cursor'] else ''}"
+                controls = [ft.Text(f"{total} mensajes con «{q}»", size=12, italic=True, color=COLORES["subtitulo"])]
+                for r in srch["resultados"]:
+                    controls.append(ft.Container(content=ft.Column([
+                        ft.Text(f"{r['correo']} - {r['practica']} P{r['problema_id']} ({r['role']})", size=10, color=COLORES["subtitulo"]),
+                        ft.Text(spans=highlighted_spans(r["fragmento"], r["resaltados"]), selectable=True, color=COLORES["texto"], size=13),
+                        ft.Text(f"📅 {r['fecha'][:16].replace('T', ' ')}", size=10, color=COLORES["subtitulo"])
+                    ]), bgcolor=COLORES["fondo"], padding=10, border_radius=5, border=ft.border.all(1, COLORES["borde"])))
+                if srch["next_cursor"]:
+                    controls.append(ft.TextButton("Cargar más resultados", icon=ft.Icons.EXPAND_MORE, on_click=lambda e: search_chats(more=True)))
+                if not srch["resultados"]:
+                    controls.append(ft.Text("Ningún mensaje coincide con la búsqueda", italic=True, color=COLORES["subtitulo"]))
+                chats_col.controls = controls
+                page.update()
+                
+        def render_data():
             with ui_lock:
                 nuevas_respuestas = []
                 nuevos_chats = []
-                raw_answers = data.get("respuestas", [])
-                raw_chats = data.get("chats", [])
-                target_prob = problem_filter.value
+                mon = state["monitor"]
+                raw_answers = mon["respuestas"]
+                raw_chats = mon["chats"]
                 
-                # --- FILTRO CLIENT-SIDE DE PROBLEMA ---
-                if target_prob and target_prob.isdigit():
-                    pid = int(target_prob)
-                    raw_answers = [r for r in raw_answers if r['problema_id'] == pid]
-                    raw_chats = [c for c in raw_chats if c['problema_id'] == pid]
+                if mon["next_cursor"].get("respuestas"):
+                    nuevas_respuestas.append(ft.TextButton("Cargar respuestas anteriores", icon=ft.Icons.EXPAND_LESS, on_click=lambda e: load_older("respuestas")))
+                if mon["next_cursor"].get("chats"):
+                    nuevos_chats.append(ft.TextButton("Cargar mensajes anteriores", icon=ft.Icons.EXPAND_LESS, on_click=lambda e: load_older("chats")))
                 
                 for r in reversed(raw_answers):
                     nuevas_respuestas.append(ft.Container(content=ft.Column([
@@ -1351,9 +1630,9 @@ def main(page: ft.Page):
                         )
                     ], horizontal_alignment=align))
                 
-                if not nuevas_respuestas:
+                if not raw_answers:
                     nuevas_respuestas.append(ft.Text("No hay respuestas registradas con estos filtros", italic=True, color=COLORES["subtitulo"]))
-                if not nuevos_chats:
+                if not raw_chats:
                     nuevos_chats.append(ft.Text("No hay historial de chat con estos filtros", italic=True, color=COLORES["subtitulo"]))
                     
                 answers_col.controls = nuevas_respuestas
@@ -1372,7 +1651,9 @@ def main(page: ft.Page):
                             student_filter, 
                             exercise_filter, 
                             problem_filter,
-                            ft.IconButton(ft.Icons.SEARCH, icon_size=20, on_click=load_data_filtered, icon_color=COLORES["primario"], tooltip="Aplicar Filtros")
+                            ft.IconButton(ft.Icons.SEARCH, icon_size=20, on_click=load_data_filtered, icon_color=COLORES["primario"], tooltip="Aplicar Filtros"),
+                            ft.IconButton(ft.Icons.REFRESH, icon_size=20, on_click=refresh_new, icon_color=COLORES["primario"], tooltip="Traer lo más reciente"),
+                            chat_search_field,
                         ], spacing=10)
                     ]),
                     padding=10,
@@ -1521,7 +1802,13 @@ def main(page: ft.Page):
                 
                 try:
                     if not sio.connected:
-                        sio.connect(BASE) 
+                        state["last_seq"] = None
+                        seen_seqs.clear()
+                    hydrate_snapshot()
+                    if not sio.connected:
+                        # El servidor nos une a la sala del profesor a partir del JWT; auth se evalúa en
+                        # cada reconexión para pedir lo emitido desde el último seq aplicado
+                        sio.connect(BASE, auth=lambda: {"token": state["token"], "last_seq": state["last_seq"]}, transports=["websocket"])
                 except Exception as err:
                     flash(f"Error de conexión: {err}", ok=False)
                     is_session_active = False
@@ -1538,15 +1825,19 @@ def main(page: ft.Page):
         def load_full_dashboard():
             reset_inactivity_timer()
             render_dashboard_view(state["students"])
+            hydrate_snapshot()
         
         def render_dashboard_view(student_list):
             with ui_lock:
                 nuevas_tarjetas = []
                 memoria_temporal = {}
                 
+                presencia_previa = {}
                 for email, datos in student_cards_state.items():
                     if 'latest_data' in datos:
                         memoria_temporal[email] = datos['latest_data']
+                    if 'online' in datos:
+                        presencia_previa[email] = datos['online']
                 student_cards_state.clear()
                 
                 if not student_list:
@@ -1576,12 +1867,7 @@ def main(page: ft.Page):
 
                         progress_pct = datos_previos.get('progress_pct', 0.0) if datos_previos else 0.0
                         
-                        if not datos_previos:
-                            txt_val = "Esperando actividad..."
-                        elif datos_previos.get('type') == 'answer':
-                            txt_val = f"Entregó P{datos_previos.get('problem_id', '?')} ({(progress_pct*100):.0f}%)"
-                        else:
-                            txt_val = f"Conversando ({(progress_pct*100):.0f}%)"
+                        txt_val = activity_text(datos_previos, progress_pct) if datos_previos else "Esperando actividad..."
 
                         bar_ctrl = ft.ProgressBar(value=progress_pct, color=COLORES["primario"], bgcolor=COLORES["borde"], height=6, border_radius=3)
                         txt_ctrl = ft.Text(txt_val, size=10, italic=True, color=COLORES["subtitulo"])
@@ -1632,6 +1918,8 @@ def main(page: ft.Page):
                         
                         if datos_previos:
                             student_cards_state[stu_email]['latest_data'] = datos_previos
+                        if stu_email in presencia_previa:
+                            set_card_presence(stu_email, presencia_previa[stu_email])
                         
                         nuevas_tarjetas.append(card)
                         
@@ -2177,6 +2465,41 @@ def main(page: ft.Page):
                 except Exception:
                     pass
                 
+        approve_all_text = ft.Text()
+        
+        def open_approve_all_dlg(e):
+            visibles = state.get("nav_pend", [])
+            if not visibles:
+                flash("No hay evaluaciones pendientes visibles", ok=False)
+                return
+            approve_all_text.value = f"Se aprobará la calificación sugerida por la IA en las {len(visibles)} evaluaciones pendientes visibles (según la búsqueda actual). ¿Deseas proceder?"
+            approve_all_dlg.open = True
+            page.update()
+            
+        def confirm_approve_all(e):
+            e.control.disabled = True
+            page.update()
+            ids = [g["id"] for g in state.get("nav_pend", [])]
+            res = auth_request("POST", "/api/teacher/grades/approve-bulk", json={"ids": ids})
+            if res and res.status_code == 200:
+                flash(f"Se aprobaron {res.json().get('approved', 0)} evaluaciones", ok=True)
+            else:
+                flash("Error al aprobar las evaluaciones", ok=False)
+            approve_all_dlg.open = False
+            e.control.disabled = False
+            load_grades()
+            page.update()
+            
+        approve_all_dlg = ft.AlertDialog(
+            title=ft.Row([ft.Icon(ft.Icons.DONE_ALL, color=COLORES["exito"]), ft.Text("Aprobar evaluaciones visibles")]),
+            content=ft.Container(content=approve_all_text, width=400),
+            actions=[
+                ft.TextButton("Cancelar", on_click=lambda e: setattr(approve_all_dlg, 'open', False) or page.update()),
+                ft.ElevatedButton("Aprobar todas", bgcolor=COLORES["exito"], color=COLORES["fondo"], on_click=confirm_approve_all)
+            ]
+        )
+        page.overlay.append(approve_all_dlg)
+        
         def download_grades_excel(e):
             # Obtener el filtro de búsqueda general si lo hay (puedes adaptarlo si decides poner dropdowns aquí)
             url = f"{BASE}/api/teacher/grades/download?token={state['token']}"
@@ -2215,6 +2538,7 @@ def main(page: ft.Page):
                     ft.Container(
                         content=ft.Column([
                             ft.Row([
+                                ft.IconButton(ft.Icons.DONE_ALL, icon_color=COLORES["exito"], icon_size=20, tooltip="Aprobar todas las visibles", on_click=open_approve_all_dlg),
                                 ft.Text("Evaluaciones Pendientes", size=20, color=COLORES["primario"], expand=True, text_align=ft.TextAlign.CENTER),
                                 ft.IconButton(ft.Icons.REFRESH, icon_color=COLORES["primario"], icon_size=20, tooltip="Refrescar", on_click=refresh_grades)
                             ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
@@ -2258,7 +2582,7 @@ def main(page: ft.Page):
             page.update()
             
             def fetch():
-                res = auth_request("GET", f"/api/teacher/student-profile/{email}")
+                res = auth_request("GET", f"/api/teacher/student-profile/{email}", params={"mode": "summary"})
                 if state.get("expected_profile_email") != email:
                     return
                 if res and res.status_code == 200:
@@ -2283,6 +2607,52 @@ def main(page: ft.Page):
                     page.update()
             threading.Thread(target=fetch, daemon=True).start()
             
+        def build_chat_bubbles(chats):
+            chat_ui_controls = []
+            for c in chats:
+                role = c.get("role", "user")
+                bg = COLORES["secundario"] if role == "user" else (COLORES["primario"] if role == "teacher" else COLORES["borde"])
+                tc = COLORES["fondo"] if role in ["user", "teacher"] else COLORES["texto"]
+                align = ft.CrossAxisAlignment.END if role == "user" else ft.CrossAxisAlignment.START
+                who = "Estudiante" if role == "user" else ("Profesor" if role=="teacher" else "Tutor IA")
+                
+                chat_ui_controls.append(
+                    ft.Column([
+                        ft.Text(f"{who} - {c['fecha'][:16].replace('T', ' ')}", size=10, color=COLORES["subtitulo"]),
+                        ft.Container(content=ft.Text(c["content"], color=tc, size=13), bgcolor=bg, padding=10, border_radius=8)
+                    ], horizontal_alignment=align, spacing=2)
+                )
+            return chat_ui_controls
+            
+        def load_transcript(e, email, prac_name, pid, answer_holder, chat_holder):
+            # El expediente llega resumido; la conversación y el texto de la respuesta se piden al abrir cada problema
+            e.control.disabled = True
+            page.update()
+            def fetch():
+                res = auth_request("GET", f"/api/teacher/student-transcript/{email}", params={"practice_name": prac_name, "problema_id": pid})
+                if res and res.status_code == 200:
+                    data = res.json()
+                    ans = data.get("respuesta")
+                    if ans and ans.get("texto"):
+                        answer_holder.content = ft.Column([
+                            ft.Text("Respuesta Entregada:", weight="bold", size=12, color=COLORES["texto"]),
+                            ft.Text(ans["texto"], size=13, color=COLORES["texto"], selectable=True)
+                        ], spacing=5)
+                    chats = data.get("chats", [])
+                    chat_holder.content = ft.Container(
+                        content=ft.Column(build_chat_bubbles(chats), spacing=10, scroll=ft.ScrollMode.AUTO),
+                        height=250, padding=10, bgcolor=COLORES["fondo"],
+                        border=ft.border.all(1, COLORES["borde"]), border_radius=5,
+                    ) if chats else ft.Text("No hay interacciones de chat en este problema.", size=12, color=COLORES["subtitulo"])
+                else:
+                    flash("Error al cargar la conversación", ok=False)
+                    e.control.disabled = False
+                try:
+                    page.update()
+                except Exception:
+                    pass
+            threading.Thread(target=fetch, daemon=True).start()
+            
         def render_student_profile(data, email):
             with ui_lock:
                 nuevos_controles_perfil = []
@@ -2356,28 +2726,28 @@ def main(page: ft.Page):
                                 score_ui = ft.Text("Pregunta no respondida aún.", italic=True, color=COLORES["advertencia"])
 
                             # UI de Historial de Chat
-                            chat_ui_controls = []
-                            if chats:
-                                for c in chats:
-                                    role = c.get("role", "user")
-                                    bg = COLORES["secundario"] if role == "user" else (COLORES["primario"] if role == "teacher" else COLORES["borde"])
-                                    tc = COLORES["fondo"] if role in ["user", "teacher"] else COLORES["texto"]
-                                    align = ft.CrossAxisAlignment.END if role == "user" else ft.CrossAxisAlignment.START
-                                    who = "Estudiante" if role == "user" else ("Profesor" if role=="teacher" else "Tutor IA")
-                                    
-                                    chat_ui_controls.append(
-                                        ft.Column([
-                                            ft.Text(f"{who} - {c['fecha'][:16].replace('T', ' ')}", size=10, color=COLORES["subtitulo"]),
-                                            ft.Container(content=ft.Text(c["content"], color=tc, size=13), bgcolor=bg, padding=10, border_radius=8)
-                                        ], horizontal_alignment=align, spacing=2)
+                            if "chats" in pdata:
+                                chat_container = ft.Container(
+                                    content=ft.Column(build_chat_bubbles(chats), spacing=10, scroll=ft.ScrollMode.AUTO),
+                                    height=250, padding=10, bgcolor=COLORES["fondo"], 
+                                    border=ft.border.all(1, COLORES["borde"]), border_radius=5,
+                                ) if chats else ft.Text("No hay interacciones de chat en este problema.", size=12, color=COLORES["subtitulo"])
+                                answer_ui = ft.Container(content=ft.Column([
+                                    ft.Text("Respuesta Entregada:", weight="bold", size=12, color=COLORES["texto"]),
+                                    ft.Text(ans["texto"], size=13, color=COLORES["texto"], selectable=True)
+                                ], spacing=5)) if ans and ans.get("texto") else ft.Container()
+                            else:
+                                num_chats = pdata.get("num_chats", 0)
+                                answer_ui = ft.Container()
+                                chat_container = ft.Container()
+                                if num_chats or ans:
+                                    chat_container.content = ft.TextButton(
+                                        f"Ver respuesta y conversación ({num_chats} mensajes)",
+                                        icon=ft.Icons.FORUM,
+                                        on_click=lambda e, pr=prac_name, p=int(pid), ah=answer_ui, ch=chat_container: load_transcript(e, email, pr, p, ah, ch)
                                     )
-                            
-                            chat_scroll = ft.Column(chat_ui_controls, spacing=10, scroll=ft.ScrollMode.AUTO)
-                            chat_container = ft.Container(
-                                content=chat_scroll,
-                                height=250, padding=10, bgcolor=COLORES["fondo"], 
-                                border=ft.border.all(1, COLORES["borde"]), border_radius=5,
-                            ) if chats else ft.Text("No hay interacciones de chat en este problema.", size=12, color=COLORES["subtitulo"])
+                                else:
+                                    chat_container.content = ft.Text("No hay interacciones de chat en este problema.", size=12, color=COLORES["subtitulo"])
 
                             # Ensamblar la Tarjeta del Problema
                             prob_card = ft.Container(
@@ -2388,8 +2758,7 @@ def main(page: ft.Page):
                                         ft.Column([
                                             ft.Text("Evaluación General:", weight="bold", size=12, color=COLORES["texto"]),
                                             score_ui,
-                                            ft.Text("Respuesta Entregada:", weight="bold", size=12, color=COLORES["texto"]) if ans else ft.Container(),
-                                            ft.Text(ans["texto"], size=13, color=COLORES["texto"], selectable=True) if ans and ans.get("texto") else ft.Container(),
+                                            answer_ui,
                                         ], expand=1),
                                         
                                         ft.Column([